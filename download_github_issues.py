@@ -1,72 +1,429 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import os, math, re
+import asyncio, itertools, json, os, math, re, sqlite3, time
+import aiohttp
 from tqdm import tqdm
-from github import Github, GithubException
 
 # ─── config ──────────────────────────────────────────────────────────────
 REPO          = "trilogy-group/eng-maintenance"
 PRODUCT_LABEL = "Product:Aurea ACRM"         # what you filter by
 FILES_WANTED  = 3
+CONCURRENCY   = 64                           # simultaneous API requests
+RATE          = 5000 / 3600                  # sustained req/s (GitHub's hourly quota)
+BURST         = 30                           # requests allowed back-to-back
+MAX_RETRIES   = 5                            # for transient API / network errors
+TRANSIENT_CODES = {500, 502, 503, 504}
+CUTOFF_SLACK  = 300                          # s subtracted from the incremental cutoff
 # ──────────────────────────────────────────────────────────────────────────
 
+API     = "https://api.github.com"
+GRAPHQL = f"{API}/graphql"
+
 # make a safe folder name, e.g.  Product:Aurea ACRM → aurea_acrm_github_issues
 slug = re.sub(r"[^A-Za-z0-9]+", "_", PRODUCT_LABEL.split(":")[-1]).strip("_").lower()
 OUTPUT_DIR = Path(f"{slug}_github_issues")
+# the cache is per repo + label, so changing either starts a fresh one
+repo_slug = re.sub(r"[^A-Za-z0-9]+", "_", REPO).strip("_").lower()
+CACHE_DB   = Path(f"{repo_slug}_{slug}_issues_cache.sqlite3")   # re-runs fetch only changes
+
+# one search page = up to 100 issues with their first 100 comments inline
+COMMENT_FIELDS = "author { login } createdAt body"
+SEARCH_QUERY = f"""
+query($q: String!, $cursor: String) {{
+  search(query: $q, type: ISSUE, first: 100, after: $cursor) {{
+    issueCount
+    nodes {{
+      ... on Issue {{
+        number title body state createdAt updatedAt
+        author {{ login }}
+        assignees(first: 10) {{ nodes {{ login }} }}
+        labels(first: 20) {{ nodes {{ name }} }}
+        comments(first: 100) {{
+          totalCount
+          nodes {{ {COMMENT_FIELDS} }}
+        }}
+      }}
+    }}
+    pageInfo {{ hasNextPage endCursor }}
+  }}
+}}
+"""
+ISSUE_SEP = b"\n\n---\n"
+NEWLINE   = b"\n"
 
 # ──────────────────────────────────────────────────────────────────────────
 
+
+class GitHubError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Async token bucket shared by the request coroutines of one quota.
+
+    Refills at `rate` tokens/s up to `burst`. update() re-derives the rate
+    from GitHub's X-RateLimit-* headers, spreading the remaining quota over
+    the time left until it resets.  GraphQL and REST draw on separate
+    quotas, so each bucket only follows headers for its own `resource`.
+    """
+
+    def __init__(self, rate: float, burst: int, resource: str):
+        self.rate     = rate
+        self.burst    = burst
+        self.resource = resource
+        self.tokens   = float(burst)
+        self.stamp    = time.monotonic()
+        self.lock     = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp  = now
+
+    async def acquire(self) -> None:
+        # waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def refund(self) -> None:
+        """Give back a token for a request that didn't count (e.g. a 304)."""
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def update(self, headers) -> None:
+        if headers.get("X-RateLimit-Resource", self.resource) != self.resource:
+            return
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset     = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        window = int(reset) - time.time()
+        if window > 0:
+            self._refill()
+            self.rate = max(int(remaining), 1) / window
+
+
+def backoff_seconds(headers) -> float:
+    """How long GitHub wants us to wait, from Retry-After / X-RateLimit-Reset."""
+    if "Retry-After" in headers:
+        return float(headers["Retry-After"])
+    reset = headers.get("X-RateLimit-Reset")
+    if reset:
+        return max(0.0, int(reset) - time.time()) + 1
+    return 60.0
+
+
+def transient_wait(attempt: int, reason: str) -> float:
+    """Back-off before retry `attempt`, or GitHubError once MAX_RETRIES are spent."""
+    if attempt >= MAX_RETRIES:
+        raise GitHubError(f"{reason} (gave up after {MAX_RETRIES} attempts)")
+    wait = 2 ** attempt
+    print(f"   transient {reason} — retry {attempt}/{MAX_RETRIES} in {wait}s")
+    return wait
+
+
+async def read_json(resp, kinds=dict):
+    """Response body as parsed JSON of the expected type(s), else GitHubError."""
+    try:
+        payload = await resp.json(content_type=None)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, kinds):
+        raise GitHubError(f"unexpected HTTP {resp.status} response from {resp.url}")
+    return payload
+
+
+def rate_limited(resp) -> bool:
+    return resp.status == 429 or (
+        resp.status == 403 and (
+            resp.headers.get("X-RateLimit-Remaining") == "0"
+            or "Retry-After" in resp.headers
+        )
+    )
+
+
+async def graphql(session, sem, bucket, query: str, **variables):
+    """POST one GraphQL query → its `data`, sleeping through rate limits and retrying 5xx."""
+    attempt = 0
+    while True:
+        try:
+            async with sem, bucket:
+                async with session.post(
+                    GRAPHQL, json={"query": query, "variables": variables}
+                ) as resp:
+                    bucket.update(resp.headers)
+                    if rate_limited(resp):
+                        wait = backoff_seconds(resp.headers)
+                        print(f"   rate-limited — sleeping {wait:.0f}s")
+                    elif resp.status in TRANSIENT_CODES:
+                        attempt += 1
+                        wait = transient_wait(attempt, f"HTTP {resp.status}")
+                    else:
+                        payload = await read_json(resp)
+                        if resp.status >= 400:
+                            raise GitHubError(payload.get("message", resp.reason))
+                        if payload.get("errors"):
+                            raise GitHubError("; ".join(e["message"] for e in payload["errors"]))
+                        return payload["data"]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            attempt += 1
+            wait = transient_wait(attempt, type(e).__name__)
+        await asyncio.sleep(wait)
+
+
+async def rest_get(session, sem, bucket, db, url: str):
+    """GET a REST url → its json, revalidating any cached ETag.
+
+    304 Not Modified answers don't count against the rate limit, so pages
+    that haven't changed since the last run are free.
+    """
+    cached  = db.execute(
+        "SELECT etag, body FROM http_cache WHERE url = ?", (url,)
+    ).fetchone()
+    headers = {"Accept": "application/vnd.github+json"}
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    attempt = 0
+    while True:
+        try:
+            async with sem, bucket:
+                async with session.get(url, headers=headers) as resp:
+                    bucket.update(resp.headers)
+                    if rate_limited(resp):
+                        wait = backoff_seconds(resp.headers)
+                        print(f"   rate-limited — sleeping {wait:.0f}s")
+                    elif resp.status in TRANSIENT_CODES:
+                        attempt += 1
+                        wait = transient_wait(attempt, f"HTTP {resp.status} on {url}")
+                    elif resp.status == 304:
+                        bucket.refund()              # not charged by GitHub
+                        return json.loads(cached[1])
+                    elif resp.status >= 400:
+                        payload = await read_json(resp)
+                        raise GitHubError(payload.get("message", resp.reason))
+                    else:
+                        payload = await read_json(resp, list)
+                        if "ETag" in resp.headers:
+                            with db:
+                                db.execute(
+                                    "INSERT OR REPLACE INTO http_cache (url, etag, body)"
+                                    " VALUES (?, ?, ?)",
+                                    (url, resp.headers["ETag"], json.dumps(payload)),
+                                )
+                        return payload
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            attempt += 1
+            wait = transient_wait(attempt, f"{type(e).__name__} on {url}")
+        await asyncio.sleep(wait)
+
+
+async def remaining_comments(session, sem, bucket, db, number: int, total: int):
+    """Comments 101+ for an issue, via conditional REST requests.
+
+    The search already told us `total`, so every page URL is known up front
+    and the pages are fetched concurrently instead of following Link headers.
+    """
+    # the GraphQL search already returned the first 100 (= REST page 1)
+    url   = f"{API}/repos/{REPO}/issues/{number}/comments?per_page=100&page={{}}"
+    pages = await asyncio.gather(
+        *[rest_get(session, sem, bucket, db, url.format(n))
+          for n in range(2, math.ceil(total / 100) + 1)]
+    )
+    return [{"author": c["user"], "createdAt": c["created_at"], "body": c["body"]}
+            for page in pages for c in page]
+
+
+async def store_page(session, sem, bucket, db, nodes) -> None:
+    """Complete one search page's overflow comments, then upsert it."""
+    # only issues with more than the 100 inlined comments need more requests
+    overflow = [iss for iss in nodes if iss["comments"]["totalCount"] > 100]
+    extra = await asyncio.gather(
+        *[remaining_comments(session, sem, bucket, db, iss["number"],
+                             iss["comments"]["totalCount"])
+          for iss in overflow]
+    )
+    for iss, more in zip(overflow, extra):
+        iss["comments"]["nodes"].extend(more)
+    for iss in nodes:
+        iss["comments"] = iss["comments"]["nodes"]
+    save_issues(db, nodes)
+
+
+async def fetch_issues(token: str, q: str, db: sqlite3.Connection) -> tuple[int, int]:
+    """Stream matching issues into the cache page by page → (fetched, matched).
+
+    Search stops paging after 1000 results, so once a window runs dry short
+    of the issueCount a new one starts at the last createdAt seen (`q` sorts
+    created-asc).  `fetched` can still fall short of `matched` if a window
+    makes no progress, e.g. when issues are deleted mid-run.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    sem       = asyncio.Semaphore(CONCURRENCY)     # requests in flight
+    gql       = TokenBucket(RATE, BURST, "graphql")  # requests per second, per quota
+    core      = TokenBucket(RATE, BURST, "core")
+    connector = aiohttp.TCPConnector(limit_per_host=CONCURRENCY)
+
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+        stores, seen, matched = [], set(), None
+        window, cursor, since = q, None, None
+        with tqdm(desc="Fetching issues") as bar:
+            while True:
+                data = await graphql(session, sem, gql, SEARCH_QUERY, q=window, cursor=cursor)
+                page = data["search"]
+                if matched is None:
+                    bar.total = matched = page["issueCount"]
+                # windows overlap on their boundary date; skip repeats
+                nodes = [n for n in page["nodes"] if n["number"] not in seen]
+                seen.update(n["number"] for n in nodes)
+                bar.update(len(nodes))
+                # finish + save this page in the background while paging on
+                stores.append(asyncio.create_task(
+                    store_page(session, sem, core, db, nodes)
+                ))
+                if page["pageInfo"]["hasNextPage"]:
+                    cursor = page["pageInfo"]["endCursor"]
+                    continue
+                last = page["nodes"][-1]["createdAt"] if page["nodes"] else None
+                if len(seen) >= matched or last is None or last == since:
+                    break
+                since, cursor = last, None
+                window = f"{q} created:>={since}"
+        await asyncio.gather(*stores)
+
+    return len(seen), matched
+
+
+def open_cache() -> sqlite3.Connection:
+    db = sqlite3.connect(CACHE_DB)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS issues ("
+        " number INTEGER PRIMARY KEY, updated_at TEXT,"
+        " issue_json TEXT, comments_json TEXT)"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS http_cache ("
+        " url TEXT PRIMARY KEY, etag TEXT, body TEXT)"
+    )
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return db
+
+
+def save_issues(db: sqlite3.Connection, issues) -> None:
+    """Upsert fetched issues; a changed issue simply replaces its old row."""
+    with db:
+        db.executemany(
+            "INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?)",
+            [(iss["number"], iss["updatedAt"],
+              json.dumps({k: v for k, v in iss.items() if k != "comments"}),
+              json.dumps(iss["comments"]))
+             for iss in issues],
+        )
+
+
+def iter_issues(db: sqlite3.Connection):
+    """Yield every cached issue in creation (= number) order, comments attached."""
+    for issue_json, comments_json in db.execute(
+        "SELECT issue_json, comments_json FROM issues ORDER BY number"
+    ):
+        iss = json.loads(issue_json)
+        iss["comments"] = json.loads(comments_json)
+        yield iss
+
+
+def login(actor) -> str:
+    """GraphQL returns a null author for deleted accounts."""
+    return actor["login"] if actor else "ghost"
+
+
+def issue_parts(iss):
+    """One issue and its comments as a list of UTF-8 chunks for writelines()."""
+    assignees = ", ".join(a["login"] for a in iss["assignees"]["nodes"]) or "–"
+    labels    = ", ".join(l["name"] for l in iss["labels"]["nodes"])
+    state     = "closed" if iss["state"] == "CLOSED" else "open"
+    parts = [
+        ISSUE_SEP,
+        f"## #{iss['number']} · {iss['title']}\n"
+        f"*{state}* · opened {iss['createdAt'][:10]} "
+        f"by **{login(iss['author'])}** · assignees: {assignees}\n\n"
+        f"Labels: {labels}\n\n"
+        f"{iss['body'] or '*No description*'}\n".encode("utf-8"),
+    ]
+    for c in iss["comments"]:
+        body = (c["body"] or "").replace("\r\n", "\n").rstrip("\n")
+        parts += [
+            f"\n> **{login(c['author'])}** commented "
+            f"{c['createdAt'][:10]}:\n>\n".encode("utf-8"),
+            body.replace("\n", "\n> ").encode("utf-8"),
+            NEWLINE,
+        ]
+    return parts
+
+
 def main():
     token = os.getenv("GITHUB_TOKEN")
     if not token:
         raise SystemExit("Set GITHUB_TOKEN env‑var first!")
 
-    gh   = Github(token, per_page=100)
-    q    = f'repo:{REPO} label:"{PRODUCT_LABEL}" is:issue'
+    db = open_cache()
+    cutoff = db.execute("SELECT value FROM meta WHERE key = 'cutoff'").fetchone()
+
+    q = f'repo:{REPO} label:"{PRODUCT_LABEL}" is:issue sort:created-asc'
+    if cutoff:
+        q += f" updated:>={cutoff[0]}"
     print("Querying GitHub for:", q)
 
+    # this run's start (less some clock-skew slack) becomes the next cutoff,
+    # but only once every page is saved: pages land out of order, so a run
+    # that dies halfway must make the next one fetch everything again
+    started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - CUTOFF_SLACK))
     try:
-        issues = list(tqdm(
-            gh.search_issues(q, sort="created", order="asc"),
-            desc="Fetching issues",
-        ))
-    except GithubException as e:
-        raise SystemExit(f"GitHub API error: {e.data.get('message', e)}")
-
-    if not issues:
+        fetched, matched = asyncio.run(fetch_issues(token, q, db))
+    except (GitHubError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise SystemExit(f"GitHub API error: {str(e) or type(e).__name__}")
+    if fetched < matched:
+        # search caps out at 1000 hits; keep the old cutoff so the issues
+        # past the cap are still looked for next run
+        print(f"Warning: search returned {fetched} of {matched} matching issues; "
+              "not advancing the incremental cutoff")
+    else:
+        with db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('cutoff', ?)", (started,))
+
+    total, = db.execute("SELECT count(*) FROM issues").fetchone()
+    if not total:
         raise SystemExit("Nothing found – check label / repo spelling.")
 
-    print(f"Retrieved {len(issues)} issues")
+    print(f"Retrieved {fetched} new/changed issues, {total} cached in total")
 
-    per_file = math.ceil(len(issues) / FILES_WANTED)
+    # the cache knows the exact total, so files stay equal-sized while issues
+    # stream straight from the cursor instead of being loaded all at once
+    per_file = math.ceil(total / FILES_WANTED)
     OUTPUT_DIR.mkdir(exist_ok=True)
 
-    for i in range(0, len(issues), per_file):
-        chunk   = issues[i : i + per_file]
-        idx     = i // per_file + 1
+    issues = iter_issues(db)
+    for idx in range(1, math.ceil(total / per_file) + 1):
         outpath = OUTPUT_DIR / f"issues_{idx:02d}.md"
+        written = 0
 
-        with outpath.open("w", encoding="utf-8") as f:
-            for iss in chunk:
-                assignees = ", ".join(a.login for a in iss.assignees) or "–"
-                labels    = ", ".join(l.name for l in iss.labels)
-                state     = "closed" if iss.state == "closed" else "open"
-                f.write(
-                    f"\n\n---\n"
-                    f"## #{iss.number} · {iss.title}\n"
-                    f"*{state}* · opened {iss.created_at:%Y-%m-%d} "
-                    f"by **{iss.user.login}** · assignees: {assignees}\n\n"
-                    f"Labels: {labels}\n\n"
-                    f"{iss.body or '*No description*'}\n"
-                )
-                for c in iss.get_comments():
-                    f.write(
-                        f"\n> **{c.user.login}** commented "
-                        f"{c.created_at:%Y-%m-%d}:\n>\n"
-                        + "\n> ".join(c.body.splitlines()) + "\n"
-                    )
-        print(f"Wrote {len(chunk)} issues → {outpath}")
+        with outpath.open("wb") as f:
+            for iss in itertools.islice(issues, per_file):
+                f.writelines(issue_parts(iss))
+                written += 1
+        print(f"Wrote {written} issues → {outpath}")
 
+    db.close()
     print("\nDone!  Files are in", OUTPUT_DIR.resolve())
 
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 # merge_markdown_from_drive.py
+#
+# remember to
+# pip install "httpx[http2]" pydrive2 google-api-python-client tqdm
+# (downloads use HTTP/2, which needs the h2 extra)
 
 from pathlib import Path
-import sys, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import shutil, sys, tempfile, threading, time
+import httpx
 from tqdm import tqdm
+from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
 
 # ───────────────────────────────────────── configuration ──
 SCOPES          = ['https://www.googleapis.com/auth/drive.readonly']
@@ -19,11 +26,22 @@ SEPARATOR       = '\n\n---\n'          # visual break between articles
 
 MAX_RETRIES     = 3                    # for transient download errors
 TRANSIENT_CODES = {500, 502, 503, 504}
+
+FOLDER_MIME     = 'application/vnd.google-apps.folder'
+LIST_BATCH      = 100                  # folder listings per batch request (API max)
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+MAX_WORKERS     = 10                   # parallel downloads
+MAX_QPS         = 10                   # Drive's per-user request quota
+
+MEDIA_URL       = 'https://www.googleapis.com/drive/v3/files/{fid}'
+COPY_CHUNK      = 1024 * 1024          # streaming read/copy size
+SPOOL_LIMIT     = 1024 * 1024          # per-file RAM before spilling to disk
 # ──────────────────────────────────────────────────────────
 
 
-def auth_drive() -> GoogleDrive:
-    """Authorise (cached) and return a GoogleDrive instance."""
+def auth_drive():
+    """Authorise (cached) → (GoogleAuth, Drive v3 service) shared by the whole run."""
     base = Path(__file__).resolve().parent
     gauth = GoogleAuth()
 
@@ -40,83 +58,251 @@ def auth_drive() -> GoogleDrive:
         gauth.LocalWebserverAuth()
         gauth.SaveCredentialsFile(str(cred_file))
 
-    return GoogleDrive(gauth)
+    # one raw discovery client instead of a PyDrive2 wrapper object per call
+    service = build('drive', 'v3', http=gauth.Get_Http_Object(), cache_discovery=False)
+    return gauth, service
 
 
-def glist(drive: GoogleDrive, query: str):
+def glist(service, query: str):
     """List files/folders with the always‑needed shared‑drive flags."""
-    return drive.ListFile({
-        'q': query,
-        'supportsAllDrives': True,
-        'includeItemsFromAllDrives': True
-    }).GetList()
+    items, token = [], None
+    while True:
+        resp = service.files().list(
+            q=query,
+            fields='nextPageToken, files(id, name, mimeType)',
+            pageSize=1000,
+            pageToken=token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True,
+        ).execute(num_retries=MAX_RETRIES)
+        items += resp.get('files', [])
+        token = resp.get('nextPageToken')
+        if not token:
+            return items
+
+
+def retryable(e: Exception) -> bool:
+    """5xx, 429 and Drive's 403 rate-limit errors are worth retrying."""
+    if not isinstance(e, HttpError):
+        return False
+    status = getattr(e.resp, 'status', None)
+    if status in TRANSIENT_CODES or status == 429:
+        return True
+    return status == 403 and any(
+        isinstance(d, dict) and d.get('reason') in RATE_LIMIT_REASONS
+        for d in (e.error_details or [])
+    )
+
+
+def rate_limited(r: httpx.Response) -> bool:
+    """Same rule as retryable(), for a raw media response."""
+    if r.status_code == 429:
+        return True
+    if r.status_code != 403:
+        return False
+    try:
+        r.read()                          # streamed; error bodies are small
+        errors = r.json().get('error', {}).get('errors', [])
+    except (ValueError, AttributeError):
+        return False
+    return any(isinstance(d, dict) and d.get('reason') in RATE_LIMIT_REASONS
+               for d in errors)
+
+
+def list_md_files(service, folder_id: str):
+    """Return [(name,id), …] for every .md file below folder_id (all depths).
+
+    Breadth-first; up to LIST_BATCH folder listings go out together as one
+    multipart batch request instead of one HTTP round-trip each.
+    """
+    paths   = {folder_id: ()}         # folder id → folder names below folder_id
+    pending = deque([(folder_id, None, 0)])        # (folder id, page token, tries)
+    found   = []
+
+    while pending:
+        jobs, failed = {}, []
+
+        def collect(request_id, response, exception):
+            fid, token, tries = jobs[request_id]
+            if exception is not None:
+                if retryable(exception) and tries < MAX_RETRIES:
+                    failed.append((fid, token, tries + 1))
+                    return
+                raise exception
+            for item in response.get('files', []):
+                path = paths[fid] + (item['name'],)
+                if item['mimeType'] == FOLDER_MIME:
+                    if item['id'] not in paths:
+                        paths[item['id']] = path
+                        pending.append((item['id'], None, 0))
+                elif item['name'].lower().endswith('.md'):
+                    found.append((path, item['id']))
+            if response.get('nextPageToken'):
+                pending.append((fid, response['nextPageToken'], 0))
+
+        batch = service.new_batch_http_request(callback=collect)
+        for _ in range(min(LIST_BATCH, len(pending))):
+            job = pending.popleft()
+            jobs[str(len(jobs))] = job
+            batch.add(service.files().list(
+                q=f"'{job[0]}' in parents and trashed=false",
+                fields='nextPageToken, files(id, name, mimeType)',
+                pageSize=1000,
+                pageToken=job[1],
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ), request_id=str(len(jobs) - 1))
+        batch.execute()
+
+        if failed:
+            wait = 2 ** max(tries for _, _, tries in failed)
+            print(f"   {len(failed)} folder listings throttled — retrying in {wait}s")
+            time.sleep(wait)
+            pending.extend(failed)
+
+    # batches mix folders, so sort by path to keep each folder's files together
+    found.sort()
+    return [(path[-1], fid) for path, fid in found]
 
 
-def recurse_md_files(drive: GoogleDrive, folder_id: str):
-    """Yield (title,id) for every .md file below folder_id (all depths)."""
-    for item in glist(drive, f"'{folder_id}' in parents and trashed=false"):
-        if item['mimeType'] == 'application/vnd.google-apps.folder':
-            yield from recurse_md_files(drive, item['id'])
-        elif item['title'].lower().endswith('.md'):
-            yield item['title'], item['id']
+_bucket_lock   = threading.Lock()
+_bucket_tokens = float(MAX_QPS)
+_bucket_stamp  = time.monotonic()
 
 
-def safe_download_md(drive: GoogleDrive, fid: str):
-    """Download file text with retry/back‑off for 5xx errors."""
+def take_token():
+    """Block until the shared token bucket allows another request (≤ MAX_QPS)."""
+    global _bucket_tokens, _bucket_stamp
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket_tokens = min(MAX_QPS, _bucket_tokens + (now - _bucket_stamp) * MAX_QPS)
+            _bucket_stamp = now
+            if _bucket_tokens >= 1:
+                _bucket_tokens -= 1
+                return
+            wait = (1 - _bucket_tokens) / MAX_QPS
+        time.sleep(wait)
+
+
+def media_client(gauth: GoogleAuth) -> httpx.Client:
+    """One pooled HTTP/2 client carrying the Drive OAuth token, for alt=media GETs."""
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        headers={'Authorization': f"Bearer {gauth.credentials.access_token}"},
+    )
+
+
+_token_lock = threading.Lock()
+
+
+def refresh_token(gauth: GoogleAuth, client: httpx.Client, stale: str):
+    """Refresh an expired access token once, however many threads hit the 401."""
+    with _token_lock:
+        if client.headers['Authorization'] == stale:
+            gauth.Refresh()
+            client.headers['Authorization'] = f"Bearer {gauth.credentials.access_token}"
+
+
+def safe_download_md(gauth: GoogleAuth, client: httpx.Client, fid: str, dest) -> bool:
+    """Stream file bytes into `dest` with retry/back‑off for 5xx and rate limits."""
+    url = MEDIA_URL.format(fid=fid)
     for attempt in range(1, MAX_RETRIES + 1):
+        take_token()
+        dest.seek(0)
+        dest.truncate()
+        auth = client.headers['Authorization']
         try:
-            return drive.CreateFile({'id': fid}).GetContentString(encoding='utf-8')
-        except HttpError as e:
-            if getattr(e.resp, 'status', None) in TRANSIENT_CODES:
-                wait = 2 ** attempt
-                print(f"   transient {e.resp.status} on {fid} — retry {attempt}/{MAX_RETRIES} in {wait}s")
-                time.sleep(wait)
-                continue
+            with client.stream('GET', url, params={'alt': 'media', 'supportsAllDrives': 'true'}) as r:
+                if r.status_code == 401:
+                    refresh_token(gauth, client, auth)
+                    continue
+                if r.status_code in TRANSIENT_CODES or rate_limited(r):
+                    retry_after = r.headers.get('Retry-After', '')
+                    wait = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+                    print(f"   transient {r.status_code} on {fid} — retry {attempt}/{MAX_RETRIES} in {wait}s")
+                    time.sleep(wait)
+                    continue
+                r.raise_for_status()
+                for chunk in r.iter_bytes(COPY_CHUNK):
+                    dest.write(chunk)
+                dest.seek(0)
+                return True
+        except httpx.HTTPStatusError:
             raise
         except Exception:
             if attempt < MAX_RETRIES:
                 time.sleep(2 ** attempt)
                 continue
             raise
-    return None
+    return False
+
+
+def fetch_md(gauth: GoogleAuth, client: httpx.Client, title: str, fid: str):
+    """Download one file into a spooled temp file → (title, fid, buffer | None)."""
+    buf = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT)
+    if safe_download_md(gauth, client, fid, buf):
+        return title, fid, buf
+    buf.close()
+    return title, fid, None
 
 
-def merge_folder(drive: GoogleDrive, folder):
+def merge_folder(gauth: GoogleAuth, service, client: httpx.Client, folder):
     OUTPUT_DIR.mkdir(exist_ok=True)
-    out_path = OUTPUT_DIR / f"{folder['title']}.md"
+    out_path = OUTPUT_DIR / f"{folder['name']}.md"
 
-    items = list(recurse_md_files(drive, folder['id']))
+    items = list_md_files(service, folder['id'])
     if not items:
-        print(f"⚠️  {folder['title']} is empty ‑ skipped")
+        print(f"⚠️  {folder['name']} is empty ‑ skipped")
         return
 
-    with out_path.open('w', encoding='utf-8') as fout:
-        for title, fid in tqdm(items, desc=f"Bundling {folder['title']}", unit='file'):
-            text = safe_download_md(drive, fid)
-            if text is None:
-                print(f"   ⚠️ skipped {title} (id {fid}) after {MAX_RETRIES} failures")
-                continue
-            fout.write(f"{SEPARATOR}# {title}\n\n{text}")
+    # downloads run in parallel into temp buffers; results are taken in
+    # submission order, so they are copied into the bundle deterministically
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex, \
+            out_path.open('wb') as fout:
+        futures = [ex.submit(fetch_md, gauth, client, *it) for it in items]
+        try:
+            for fut in tqdm(futures, desc=f"Bundling {folder['name']}", unit='file'):
+                title, fid, buf = fut.result()
+                if buf is None:
+                    print(f"   ⚠️ skipped {title} (id {fid}) after {MAX_RETRIES} failures")
+                    continue
+                with buf:
+                    fout.write(f"{SEPARATOR}# {title}\n\n".encode('utf-8'))
+                    shutil.copyfileobj(buf, fout, COPY_CHUNK)
+        except BaseException:
+            # stop at the first hard failure: drop queued downloads, let the
+            # in-flight ones finish, then free buffers that won't be copied
+            ex.shutdown(cancel_futures=True)
+            for fut in futures:
+                if not fut.cancelled() and fut.exception() is None:
+                    buf = fut.result()[2]
+                    if buf is not None:
+                        buf.close()
+            raise
 
-    print(f"✅  {folder['title']}  →  {out_path}")
+    print(f"✅  {folder['name']}  →  {out_path}")
 
 
 def main():
-    drive = auth_drive()
+    gauth, service = auth_drive()
 
     # If the folder lives only in “Shared with me”, add a shortcut to My Drive
     top_folders = glist(
-        drive,
+        service,
         f"'{ROOT_FOLDER_ID}' in parents "
-        f"and mimeType='application/vnd.google-apps.folder' "
+        f"and mimeType='{FOLDER_MIME}' "
         f"and trashed=false"
     )
 
     if not top_folders:
         sys.exit("No sub‑folders found – is ROOT_FOLDER_ID correct & visible to the Drive API?")
 
-    for folder in top_folders:
-        merge_folder(drive, folder)
+    # one client for every folder, so TLS connections are reused throughout
+    with media_client(gauth) as client:
+        for folder in top_folders:
+            merge_folder(gauth, service, client, folder)
 
 
 if __name__ == '__main__':
@@ -4,7 +4,8 @@ Merge all PDFs in a folder into exactly N larger PDFs.
 Outputs go to a sub‑folder (default: merged_pdfs).
 
 remember to
-pip install pypdf
+pip install pikepdf
+(if the qpdf command-line tool is on PATH it is used instead)
 
 Examples
 --------
@@ -14,53 +15,125 @@ python merge_into_n_pdfs.py 5 . --out big    # custom output sub‑folder
 """
 
 import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Tuple
 
-from pypdf import PdfReader, PdfWriter
+import pikepdf
+
+# the qpdf CLI concatenates fastest; pikepdf (same C++ library) is the fallback
+QPDF = shutil.which("qpdf")
+FLUSH_EVERY = 50          # pikepdf fallback: inputs merged between partial saves
 
 
 # ---------- helpers ----------------------------------------------------------
-def chunkify(items: List[Path], n_chunks: int) -> List[List[Path]]:
-    n_chunks = max(1, min(n_chunks, len(items)))
-    base, rem = divmod(len(items), n_chunks)
+def chunk_spans(n_items: int, n_chunks: int) -> Iterator[Tuple[int, int]]:
+    n_chunks = max(1, min(n_chunks, n_items))
+    base, rem = divmod(n_items, n_chunks)
 
-    chunks, start = [], 0
+    start = 0
     for i in range(n_chunks):
         end = start + base + (1 if i < rem else 0)
-        chunks.append(items[start:end])
+        yield start, end
         start = end
-    return chunks
 
 
-def merge_pdfs(files: List[Path], output_path: Path) -> None:
-    writer = PdfWriter()
-    for pdf in files:
-        reader = PdfReader(pdf)
-        for page in reader.pages:
-            writer.add_page(page)
+def merge_pdfs_qpdf(files: List[Path], output_path: Path) -> None:
+    # arguments go through an @argfile so huge chunks don't hit ARG_MAX
+    with tempfile.NamedTemporaryFile("w", suffix=".args", delete=False,
+                                     encoding="utf-8") as fh:
+        fh.write("\n".join(["--empty", "--stream-data=preserve", "--pages",
+                            *map(str, files), "--", str(output_path)]))
+    try:
+        proc = subprocess.run([QPDF, f"@{fh.name}"])
+    finally:
+        os.unlink(fh.name)
+    # exit status 3 means "succeeded with warnings"
+    if proc.returncode not in (0, 3):
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
 
+def merge_pdfs(files: List[Path], output_path: Path) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("wb") as fh:
-        writer.write(fh)
+    if QPDF:
+        merge_pdfs_qpdf(files, output_path)
+        return
+
+    # pikepdf copies pages inside qpdf; stream data is only read at save()
+    # time, so sources must stay open until the output is written.  Saving
+    # every FLUSH_EVERY inputs to a partial file, and reopening that (lazily,
+    # from disk) for the next round, keeps no more than FLUSH_EVERY + 1 PDFs
+    # open at once.  The last round saves straight to output_path.
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as tmp:
+        partial_path = None
+        for rnd, start in enumerate(range(0, len(files), FLUSH_EVERY)):
+            last = start + FLUSH_EVERY >= len(files)
+            next_path = output_path if last else Path(tmp) / f"part_{rnd}.pdf"
+            with ExitStack() as stack:
+                dst = stack.enter_context(
+                    pikepdf.Pdf.open(partial_path) if partial_path
+                    else pikepdf.Pdf.new()
+                )
+                for pdf in files[start:start + FLUSH_EVERY]:
+                    src = stack.enter_context(pikepdf.Pdf.open(pdf))
+                    dst.pages.extend(src.pages)
+                # pass content streams through untouched instead of re-encoding them
+                dst.save(
+                    next_path,
+                    linearize=False,
+                    compress_streams=False,
+                    stream_decode_level=pikepdf.StreamDecodeLevel.none,
+                )
+            if partial_path:
+                partial_path.unlink()
+            partial_path = next_path
+
+
+_pdf_files: List[Path] = []
+
+
+def _init_worker(pdf_files: List[Path]) -> None:
+    # each worker gets the file list once; jobs then only carry index pairs
+    global _pdf_files
+    _pdf_files = pdf_files
+
+
+def _merge_one(job, out_dir: Path, folder: Path) -> None:
+    idx, (start, end) = job
+    group = _pdf_files[start:end]
+    out_name = out_dir / f"merged_{idx:02d}.pdf"
+    print(f"Merging {len(group):>3} files → {out_name.relative_to(folder)}", flush=True)
+    merge_pdfs(group, out_name)
 
 
 # ---------- main -------------------------------------------------------------
 def main(folder: Path, n_outputs: int, out_subdir: str) -> None:
-    pdf_files = sorted(folder.glob("*.pdf"))
+    # one scandir pass; DirEntry caches the file type, so no per-file stat()
+    with os.scandir(folder) as it:
+        names = sorted(e.name for e in it
+                       if e.is_file() and e.name.lower().endswith(".pdf"))
+    pdf_files = [folder / n for n in names]
     if not pdf_files:
         print(f"No PDFs found in {folder}")
         return
 
     out_dir = folder / out_subdir
-    chunks = chunkify(pdf_files, n_outputs)
+    spans = list(chunk_spans(len(pdf_files), n_outputs))
 
-    for idx, group in enumerate(chunks, 1):
-        out_name = out_dir / f"merged_{idx:02d}.pdf"
-        print(f"Merging {len(group):>3} files → {out_name.relative_to(folder)}")
-        merge_pdfs(group, out_name)
+    # every output is independent, so merge them in separate processes
+    workers = min(len(spans), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(pdf_files,)) as ex:
+        list(ex.map(partial(_merge_one, out_dir=out_dir, folder=folder),
+                    enumerate(spans, 1)))
 
-    print(f"\nDone. {len(chunks)} merged PDFs written to {out_dir}")
+    print(f"\nDone. {len(spans)} merged PDFs written to {out_dir}")
 
 
 if __name__ == "__main__":